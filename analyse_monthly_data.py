@@ -1,136 +1,413 @@
 import dash
-from dash import dcc, html, dash_table
+from dash import dcc, html, dash_table, ctx, Patch
 from dash.dependencies import Input, Output
+from flask_caching import Cache
 import plotly.graph_objs as go
 import plotly.express as px
 import pandas as pd
+import numpy as np
 import sqlite3
+import logging
+import math
 import os
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
 from datetime import datetime
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
 
 # Database path
 DB_PATH = 'data/energy_data.db'
 
+# Map abbreviated OBIS categories to full names
+_CAT_MAP = {'C': 'Consumption', 'P': 'Production'}
+
+# Ratio bucket each OBIS code contributes to
+_OBIS_BUCKET = {
+    '1-1:1.29.0': 'measured_consumption',        # Measured active consumption
+    '1-65:1.29.9': 'energy_bought',              # Remaining consumption bought from supplier
+    '1-65:1.29.1': 'energy_shared_consumption',  # Shared consumption, layers 1-4
+    '1-65:1.29.2': 'energy_shared_consumption',
+    '1-65:1.29.3': 'energy_shared_consumption',
+    '1-65:1.29.4': 'energy_shared_consumption',
+    '1-1:2.29.0': 'measured_production',         # Measured active production
+    '1-65:2.29.1': 'energy_shared_production',   # Shared production, layers 1-4
+    '1-65:2.29.2': 'energy_shared_production',
+    '1-65:2.29.3': 'energy_shared_production',
+    '1-65:2.29.4': 'energy_shared_production',
+    '1-65:2.29.9': 'energy_sold',                # Remaining production sold to market
+}
+
+# Ratio bucket each (full name) OBIS category contributes to
+_CATEGORY_BUCKET = {'Consumption': 'total_consumption', 'Production': 'total_production'}
+
+# Columns of the monthly_ratios table, in calculate_ratios() order
+_RATIO_FIELDS = (
+    'total_consumption', 'total_production',
+    'measured_consumption', 'measured_production',
+    'energy_bought', 'energy_shared_consumption',
+    'energy_shared_production', 'energy_sold',
+    'production_to_consumption_ratio', 'self_consumption_ratio',
+    'self_sufficiency_ratio', 'energy_bought_ratio', 'energy_sold_ratio',
+)
+
+# Columns shown in the detailed metering data table
+DATA_TABLE_COLUMNS = ['entity_type', 'entity_name', 'meter_id', 'obis_code', 
+                      'obis_category', 'obis_description', 'value', 'unit']
+
+# Columns shown in the monthly summary table
+SUMMARY_TABLE_COLUMNS = ['obis_code', 'obis_category', 'obis_description', 
+                         'total_value', 'num_meters', 'unit']
+
+# OBIS codes plotted in the trends chart
+_TREND_CODES = frozenset(('1-1:1.29.0', '1-1:2.29.0', '1-65:1.29.9', '1-65:2.29.9'))
+
+# Chart colors per (full name) OBIS category
+_CATEGORY_COLORS = {'Consumption': '#e74c3c', 'Production': '#27ae60'}
+
+# DataTable filter operators and their SQL equivalents
+_FILTER_OPERATORS = [
+    ('ge ', '>='), ('le ', '<='), ('lt ', '<'), ('gt ', '>'),
+    ('ne ', '!='), ('eq ', '='), ('contains ', None),
+]
+
+# Low-cardinality text columns kept as pandas categoricals
+_CATEGORY_COLUMNS = ('obis_category', 'obis_code', 'entity_type', 'entity_name', 'unit')
+
+# Small integer columns downcast after loading
+_INTEGER_COLUMNS = ('year', 'month', 'num_meters')
+
+# One persistent connection shared by all server threads.
+# The threaded development server starts a new thread per request, so
+# per-thread connections would be reopened on every callback; _db_lock
+# serializes access instead. Apart from the derived monthly_ratios table the
+# dashboard only reads the database, so WAL mode lets it keep the connection
+# open while get_monthly_data.py writes a new month.
+_db_lock = threading.RLock()
+_db = None
+
+def _conn():
+    """Return the shared database connection, opening it on first use.
+    
+    Callers must hold _db_lock while they use the connection.
+    """
+    global _db
+    with _db_lock:
+        if _db is None:
+            _db = sqlite3.connect(DB_PATH, check_same_thread=False)
+            _db.executescript("""
+                PRAGMA journal_mode=WAL;
+                PRAGMA synchronous=NORMAL;
+                PRAGMA temp_store=MEMORY;
+                PRAGMA mmap_size=1073741824;
+                PRAGMA cache_size=-131072;
+            """)
+        return _db
+
+@contextmanager
+def _transaction():
+    """Run the enclosed statements in one short write transaction on the shared connection.
+    
+    The connection lock is held throughout. BEGIN IMMEDIATE takes the write
+    lock up front instead of upgrading a read snapshot, which fails when
+    another connection has written in the meantime.
+    """
+    with _db_lock:
+        conn = _conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+# Set once ensure_schema() has succeeded
+_schema_ready = False
+
+def ensure_schema():
+    """Create the indexes and derived tables used by the dashboard if they are missing."""
+    global _schema_ready
+    with _db_lock:
+        conn = _conn()
+        # Ratios per month, filled lazily by calculate_ratios()
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS monthly_ratios (
+                year INTEGER NOT NULL,
+                month INTEGER NOT NULL,
+                {', '.join(f'{field} REAL' for field in _RATIO_FIELDS)},
+                PRIMARY KEY (year, month)
+            )
+        """)
+        # Same names as get_monthly_data.py, so these are no-ops on databases it created
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_metering_year_month 
+            ON metering_data(year, month)
+        """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_summary_year_month 
+            ON monthly_summaries(year, month)
+        """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_ym_code 
+            ON metering_data(year, month, obis_code)
+        """)
+        conn.commit()
+        _schema_ready = True
+
 # Check if database exists
 if not os.path.exists(DB_PATH):
     print(f"WARNING: Database not found at {DB_PATH}")
     print("Please run 'python energy_fetcher.py' to fetch data first.")
 else:
     print(f"Database found at {DB_PATH}")
+    try:
+        ensure_schema()
+    except sqlite3.Error as e:
+        print(f"WARNING: Could not prepare database schema: {e}")
 
 # Initialize the Dash app
 app = dash.Dash(__name__)
 app.title = "Energy Data Dashboard"
 
+# Cache per-month query results so callbacks sharing a month don't re-query.
+# The cache lives in this process, so it starts empty on every restart.
+CACHE_TIMEOUT = 3600
+cache = Cache(app.server, config={
+    'CACHE_TYPE': 'SimpleCache'
+})
+
+# PRAGMA data_version as of the previous request
+_data_version = None
+
+@app.server.before_request
+def _invalidate_stale_cache():
+    """Drop cached results once another connection, e.g. get_monthly_data.py, has written."""
+    global _data_version
+    if not os.path.exists(DB_PATH):
+        return
+    
+    with _db_lock:
+        # A failed probe only skips invalidation, it must not fail the request
+        try:
+            version = _conn().execute('PRAGMA data_version').fetchone()[0]
+        except sqlite3.Error as e:
+            logger.warning("Could not check database version: %s", e)
+            return
+        if _data_version is not None and version != _data_version:
+            logger.debug("Database changed, clearing cached results")
+            cache.clear()
+            get_available_months.cache_clear()
+        _data_version = version
+
 # Helper functions
+def _query(sql, params=()):
+    """Run a query and return its rows along with the column names."""
+    with _db_lock:
+        cursor = _conn().execute(sql, params)
+        return cursor.fetchall(), [d[0] for d in cursor.description]
+
+@lru_cache(maxsize=1)
 def get_available_months():
     """Get list of available year-months from database."""
     try:
-        conn = sqlite3.connect(DB_PATH)
         query = """
             SELECT DISTINCT year, month 
             FROM metering_data 
             ORDER BY year DESC, month DESC
         """
-        df = pd.read_sql_query(query, conn)
-        conn.close()
+        rows, _ = _query(query)
         
-        print(f"DEBUG: Found {len(df)} months in database")
+        logger.debug("Found %d months in database", len(rows))
         
-        if df.empty:
+        if not rows:
             print("WARNING: No data found in database. Please run energy_fetcher.py first.")
             return []
         
-        months = []
-        for _, row in df.iterrows():
-            label = f"{row['year']}-{row['month']:02d}"
-            value = f"{row['year']}-{row['month']}"
-            months.append({'label': label, 'value': value})
-        
-        return months
+        return [{'label': f"{year}-{month:02d}", 'value': f"{year}-{month}"} for year, month in rows]
     except Exception as e:
         print(f"ERROR loading months: {e}")
         return []
 
+def _compact_dtypes(df):
+    """Store columns in their smallest suitable dtypes."""
+    for col in _CATEGORY_COLUMNS:
+        if col in df:
+            df[col] = df[col].astype('category')
+    
+    # Energy values stay float64: they are summed and displayed with 2 decimals
+    for col in _INTEGER_COLUMNS:
+        if col in df:
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+    
+    return df
+
+@cache.memoize(timeout=CACHE_TIMEOUT)
 def load_metering_data(year=None, month=None):
     """Load metering data from database."""
-    conn = sqlite3.connect(DB_PATH)
-    
     if year and month:
         query = """
             SELECT * FROM metering_data 
             WHERE year = ? AND month = ?
         """
-        df = pd.read_sql_query(query, conn, params=(year, month))
+        rows, columns = _query(query, (year, month))
     else:
         query = "SELECT * FROM metering_data"
-        df = pd.read_sql_query(query, conn)
+        rows, columns = _query(query)
     
-    conn.close()
-    return df
+    return _compact_dtypes(pd.DataFrame.from_records(rows, columns=columns))
 
+@cache.memoize(timeout=CACHE_TIMEOUT)
 def load_summary_data(year=None, month=None):
     """Load summary data from database."""
-    conn = sqlite3.connect(DB_PATH)
-    
     if year and month:
         query = """
             SELECT * FROM monthly_summaries 
             WHERE year = ? AND month = ?
         """
-        df = pd.read_sql_query(query, conn, params=(year, month))
+        rows, columns = _query(query, (year, month))
     else:
         query = "SELECT * FROM monthly_summaries ORDER BY year, month"
-        df = pd.read_sql_query(query, conn)
+        rows, columns = _query(query)
     
-    conn.close()
-    return df
+    return _compact_dtypes(pd.DataFrame.from_records(rows, columns=columns))
 
-def calculate_ratios(year, month):
-    """Calculate energy ratios for a specific month."""
-    df = load_metering_data(year, month)
-    
-    if df.empty:
-        return {}
-    
-    print(f"DEBUG: Loaded {len(df)} rows for {year}-{month}")
-    print(f"DEBUG: Categories: {df['obis_category'].unique()}")
-    print(f"DEBUG: Sample data:\n{df[['obis_code', 'obis_category', 'value']].head()}")
-    
-    # Map abbreviated categories to full names if needed
-    category_map = {'C': 'Consumption', 'P': 'Production'}
-    if 'C' in df['obis_category'].values or 'P' in df['obis_category'].values:
-        df['obis_category'] = df['obis_category'].map(lambda x: category_map.get(x, x))
-    
-    # Total consumption (all consumption OBIS codes)
-    consumption_df = df[df['obis_category'] == 'Consumption']
-    total_consumption = consumption_df['value'].sum()
-    print(f"DEBUG: Total consumption from {len(consumption_df)} rows: {total_consumption}")
-    
-    # Total production (all production OBIS codes)
-    production_df = df[df['obis_category'] == 'Production']
-    total_production = production_df['value'].sum()
-    print(f"DEBUG: Total production from {len(production_df)} rows: {total_production}")
-    
-    # Measured active consumption (1-1:1.29.0)
-    measured_consumption = df[df['obis_code'] == '1-1:1.29.0']['value'].sum()
-    
-    # Remaining consumption after sharing (1-65:1.29.9) - energy bought from supplier
-    energy_bought = df[df['obis_code'] == '1-65:1.29.9']['value'].sum()
+def load_ratio_inputs(year, month):
+    """Load per-OBIS-code totals for a specific month, aggregated in SQL."""
+    query = """
+        SELECT obis_code, obis_category, SUM(value) 
+        FROM metering_data 
+        WHERE year = ? AND month = ? 
+        GROUP BY obis_code, obis_category
+    """
+    rows, _ = _query(query, (year, month))
+    return {(obis_code, obis_category): total for obis_code, obis_category, total in rows}
+
+def _split_filter_part(filter_part):
+    """Split one DataTable filter expression into (column, SQL operator, value)."""
+    for operator, sql_operator in _FILTER_OPERATORS:
+        for token in (operator, f"{sql_operator} " if sql_operator else None):
+            if token and token in filter_part:
+                name_part, value_part = filter_part.split(token, 1)
+                name = name_part[name_part.find('{') + 1: name_part.rfind('}')]
+                value = value_part.strip()
+                
+                if value and value[0] == value[-1] and value[0] in ("'", '"', '`'):
+                    value = value[1:-1].replace('\\' + value[0], value[0])
+                elif sql_operator:
+                    try:
+                        value = float(value)
+                    except ValueError:
+                        pass
+                
+                return name, sql_operator or 'contains', value
+    
+    return None, None, None
+
+def load_metering_page(year, month, page_current, page_size, sort_by=None, filter_query=''):
+    """Load one page of metering data, filtered and sorted in SQL.
+    
+    Returns a tuple of (records, total_rows) where total_rows counts every
+    row matching the filter, not just the returned page.
+    """
+    where = ['year = ?', 'month = ?']
+    params = [year, month]
+    
+    for filter_part in (filter_query or '').split(' && '):
+        column, operator, value = _split_filter_part(filter_part)
+        if column not in DATA_TABLE_COLUMNS:
+            continue
+        if operator == 'contains':
+            where.append(f"instr({column}, ?) > 0")
+            params.append(str(value))
+        else:
+            where.append(f"{column} {operator} ?")
+            params.append(value)
+    
+    order_by = [
+        f"{sort['column_id']} {'DESC' if sort['direction'] == 'desc' else 'ASC'}"
+        for sort in (sort_by or []) if sort['column_id'] in DATA_TABLE_COLUMNS
+    ]
+    order_by.append('id')
+    
+    where_sql = ' AND '.join(where)
+    rows, _ = _query(f"SELECT COUNT(*) FROM metering_data WHERE {where_sql}", params)
+    total_rows = rows[0][0]
+    
+    rows, columns = _query(f"""
+        SELECT {', '.join(DATA_TABLE_COLUMNS)} FROM metering_data 
+        WHERE {where_sql} 
+        ORDER BY {', '.join(order_by)} 
+        LIMIT ? OFFSET ?
+    """, (*params, page_size, page_current * page_size))
+    
+    return [dict(zip(columns, row)) for row in rows], total_rows
+
+def m4_downsample(x, y, pixel_width=800):
+    """Select the points of a time series kept by M4 downsampling.
+    
+    The x range is split into pixel_width bins and, per bin, the first, last,
+    minimum and maximum points are kept, which renders identically to the full
+    series at that width. Returns the sorted positions of the kept points;
+    series with at most 4 points per bin are returned whole.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    
+    if n <= 4 * pixel_width:
+        return np.arange(n)
+    
+    order = np.argsort(x, kind='stable')
+    x, y = x[order], y[order]
+    
+    span = x[-1] - x[0]
+    if span > 0:
+        bins = ((x - x[0]) / span * (pixel_width - 1)).astype(int)
+    else:
+        bins = np.zeros(n, dtype=int)
     
-    # Shared consumption (sum of layers 1-4)
-    shared_codes = ['1-65:1.29.1', '1-65:1.29.2', '1-65:1.29.3', '1-65:1.29.4']
-    energy_shared_consumption = df[df['obis_code'].isin(shared_codes)]['value'].sum()
+    # First and last point of each bin (x is sorted, so bins are contiguous)
+    firsts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+    lasts = np.r_[firsts[1:], n] - 1
     
-    # Production metrics
-    measured_production = df[df['obis_code'] == '1-1:2.29.0']['value'].sum()
+    # Within each bin sort by y: its first entry is the minimum, its last the maximum
+    by_value = np.lexsort((y, bins))
     
-    # Shared production (sum of layers 1-4)
-    shared_prod_codes = ['1-65:2.29.1', '1-65:2.29.2', '1-65:2.29.3', '1-65:2.29.4']
-    energy_shared_production = df[df['obis_code'].isin(shared_prod_codes)]['value'].sum()
+    kept = np.unique(np.concatenate([firsts, lasts, by_value[firsts], by_value[lasts]]))
+    return np.sort(order[kept])
+
+def _ratios_from_totals(sums):
+    """Calculate energy ratios from the per-OBIS-code totals returned by load_ratio_inputs()."""
+    if not sums:
+        return {}
     
-    # Remaining production after sharing (1-65:2.29.9) - energy sold to market
-    energy_sold = df[df['obis_code'] == '1-65:2.29.9']['value'].sum()
+    logger.debug("Loaded %d OBIS totals", len(sums))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Categories: %s", sorted({category for _, category in sums}))
+    
+    # Roll the totals up into the ratio buckets in a single pass
+    buckets = defaultdict(float)
+    for (obis_code, obis_category), total in sums.items():
+        bucket = _OBIS_BUCKET.get(obis_code)
+        if bucket:
+            buckets[bucket] += total
+        bucket = _CATEGORY_BUCKET.get(_CAT_MAP.get(obis_category, obis_category))
+        if bucket:
+            buckets[bucket] += total
+    
+    total_consumption = buckets['total_consumption']
+    total_production = buckets['total_production']
+    measured_consumption = buckets['measured_consumption']
+    energy_bought = buckets['energy_bought']
+    energy_shared_consumption = buckets['energy_shared_consumption']
+    measured_production = buckets['measured_production']
+    energy_shared_production = buckets['energy_shared_production']
+    energy_sold = buckets['energy_sold']
+    logger.debug("Total consumption: %s", total_consumption)
+    logger.debug("Total production: %s", total_production)
     
     # Calculate ratios
     ratios = {
@@ -151,7 +428,93 @@ def calculate_ratios(year, month):
     
     return ratios
 
+@cache.memoize(timeout=CACHE_TIMEOUT)
+def calculate_ratios(year, month):
+    """Calculate energy ratios for a specific month, reusing stored ratios when present.
+    
+    The lookup, the aggregation and storing the result share one write
+    transaction, so a month that get_monthly_data.py rewrites meanwhile
+    cannot end up with ratios computed from its old data.
+    """
+    if not _schema_ready:
+        # Retry if ensure_schema() failed at startup, e.g. while the database was locked
+        try:
+            ensure_schema()
+        except sqlite3.Error as e:
+            logger.warning("Could not prepare database schema: %s", e)
+    
+    try:
+        with _transaction() as conn:
+            row = conn.execute(f"""
+                SELECT {', '.join(_RATIO_FIELDS)} FROM monthly_ratios 
+                WHERE year = ? AND month = ?
+            """, (year, month)).fetchone()
+            
+            if row:
+                return dict(zip(_RATIO_FIELDS, row))
+            
+            ratios = _ratios_from_totals(load_ratio_inputs(year, month))
+            
+            # Store the result so later requests for this month are a single row fetch
+            if ratios:
+                conn.execute(f"""
+                    INSERT OR REPLACE INTO monthly_ratios 
+                    (year, month, {', '.join(_RATIO_FIELDS)})
+                    VALUES (?, ?, {', '.join('?' for _ in _RATIO_FIELDS)})
+                """, (year, month, *(ratios[field] for field in _RATIO_FIELDS)))
+            
+            return ratios
+    except sqlite3.OperationalError as e:
+        # monthly_ratios is only a cache: if it can't be used, e.g. while
+        # get_monthly_data.py holds the write lock, calculate without storing
+        logger.warning("Could not use stored ratios for %s-%s: %s", year, month, e)
+        return _ratios_from_totals(load_ratio_inputs(year, month))
+
+# Ratio charts are built once with zero values; update_ratio_charts patches in the numbers
+# Consumption breakdown pie chart
+consumption_fig = go.Figure(data=[go.Pie(
+    labels=['Energy Shared (Self-Consumption)', 'Energy Bought from Grid'],
+    values=[0, 0],
+    marker_colors=['#27ae60', '#e74c3c'],
+    hole=0.4
+)])
+consumption_fig.update_layout(
+    title="Consumption Breakdown",
+    height=400
+)
+
+# Production breakdown pie chart
+production_fig = go.Figure(data=[go.Pie(
+    labels=['Energy Shared', 'Energy Sold to Market'],
+    values=[0, 0],
+    marker_colors=['#3498db', '#f39c12'],
+    hole=0.4
+)])
+production_fig.update_layout(
+    title="Production Breakdown",
+    height=400
+)
+
+# Key ratios bar chart
+ratios_fig = go.Figure(data=[
+    go.Bar(
+        x=['Production/Consumption', 'Self-Sufficiency', 'Energy Bought', 'Energy Sold'],
+        y=[0, 0, 0, 0],
+        marker_color=['#27ae60', '#3498db', '#e74c3c', '#f39c12'],
+        text=['0%', '0%', '0%', '0%'],
+        textposition='auto',
+    )
+])
+ratios_fig.update_layout(
+    title="Key Ratios (%)",
+    yaxis_title="Percentage",
+    height=400
+)
+
 # App layout
+months = get_available_months()
+default_month = months[0]['value'] if months else None
+
 app.layout = html.Div([
     html.Div([
         html.H1("Energy Data Dashboard", style={'textAlign': 'center', 'color': '#2c3e50'}),
@@ -163,13 +526,16 @@ app.layout = html.Div([
         html.Label("Select Month:", style={'fontWeight': 'bold', 'fontSize': 16}),
         dcc.Dropdown(
             id='month-selector',
-            options=get_available_months(),
-            value=get_available_months()[0]['value'] if get_available_months() else None,
+            options=months,
+            value=default_month,
             clearable=False,
             style={'width': '300px'}
         ),
     ], style={'marginBottom': 30, 'marginLeft': 20}),
     
+    # Ratios and OBIS summary for the selected month, shared by the callbacks below
+    dcc.Store(id='month-store'),
+    
     # Key metrics cards
     html.Div(id='metrics-cards', style={'marginBottom': 30}),
     
@@ -180,6 +546,15 @@ app.layout = html.Div([
             html.Div([
                 html.H3("Energy Flow Analysis", style={'marginTop': 20}),
                 html.Div(id='ratio-charts'),
+                html.Div([
+                    dcc.Graph(id='consumption-breakdown-chart', figure=consumption_fig,
+                              style={'width': '48%', 'display': 'inline-block'}),
+                    dcc.Graph(id='production-breakdown-chart', figure=production_fig,
+                              style={'width': '48%', 'display': 'inline-block', 'marginLeft': '4%'}),
+                ]),
+                html.Div([
+                    dcc.Graph(id='key-ratios-chart', figure=ratios_fig),
+                ]),
             ])
         ]),
         
@@ -203,7 +578,39 @@ app.layout = html.Div([
         dcc.Tab(label='Detailed Data', children=[
             html.Div([
                 html.H3("Metering Data", style={'marginTop': 20}),
-                html.Div(id='data-table'),
+                dash_table.DataTable(
+                    id='data-table',
+                    columns=[
+                        {'name': col, 'id': col, 'type': 'numeric' if col == 'value' else 'text'}
+                        for col in DATA_TABLE_COLUMNS
+                    ],
+                    style_table={'overflowX': 'auto'},
+                    style_cell={
+                        'textAlign': 'left',
+                        'padding': '10px',
+                        'fontSize': 12
+                    },
+                    style_header={
+                        'backgroundColor': '#2c3e50',
+                        'color': 'white',
+                        'fontWeight': 'bold'
+                    },
+                    style_data_conditional=[
+                        {
+                            'if': {'row_index': 'odd'},
+                            'backgroundColor': '#f9f9f9'
+                        }
+                    ],
+                    # Paging, sorting and filtering run in SQL, one page at a time
+                    page_action='custom',
+                    page_current=0,
+                    page_size=20,
+                    sort_action='custom',
+                    sort_mode='single',
+                    sort_by=[],
+                    filter_action='custom',
+                    filter_query=''
+                ),
             ])
         ]),
         
@@ -219,16 +626,32 @@ app.layout = html.Div([
 
 # Callbacks
 @app.callback(
-    Output('metrics-cards', 'children'),
+    Output('month-store', 'data'),
     Input('month-selector', 'value')
 )
-def update_metrics(selected_month):
+def update_month_store(selected_month):
     if not selected_month:
-        return html.Div("No data available")
+        return None
     
     year, month = map(int, selected_month.split('-'))
+    
     ratios = calculate_ratios(year, month)
+    summary = load_summary_data(year, month)
     
+    return {
+        'ratios': ratios,
+        'summary': summary[SUMMARY_TABLE_COLUMNS].to_dict('records')
+    }
+
+@app.callback(
+    Output('metrics-cards', 'children'),
+    Input('month-store', 'data')
+)
+def update_metrics(month_data):
+    if month_data is None:
+        return html.Div("No data available")
+    
+    ratios = month_data['ratios']
     if not ratios:
         return html.Div("No data available for selected month")
     
@@ -283,77 +706,39 @@ def update_metrics(selected_month):
 
 @app.callback(
     Output('ratio-charts', 'children'),
-    Input('month-selector', 'value')
+    Output('consumption-breakdown-chart', 'figure'),
+    Output('production-breakdown-chart', 'figure'),
+    Output('key-ratios-chart', 'figure'),
+    Input('month-store', 'data')
 )
-def update_ratio_charts(selected_month):
-    if not selected_month:
-        return html.Div("No data available")
-    
-    year, month = map(int, selected_month.split('-'))
-    ratios = calculate_ratios(year, month)
-    
-    if not ratios:
-        return html.Div("No data available")
-    
-    # Consumption breakdown pie chart
-    consumption_fig = go.Figure(data=[go.Pie(
-        labels=['Energy Shared (Self-Consumption)', 'Energy Bought from Grid'],
-        values=[ratios['energy_shared_consumption'], ratios['energy_bought']],
-        marker_colors=['#27ae60', '#e74c3c'],
-        hole=0.4
-    )])
-    consumption_fig.update_layout(
-        title="Consumption Breakdown",
-        height=400
-    )
-    
-    # Production breakdown pie chart
-    production_fig = go.Figure(data=[go.Pie(
-        labels=['Energy Shared', 'Energy Sold to Market'],
-        values=[ratios['energy_shared_production'], ratios['energy_sold']],
-        marker_colors=['#3498db', '#f39c12'],
-        hole=0.4
-    )])
-    production_fig.update_layout(
-        title="Production Breakdown",
-        height=400
-    )
-    
-    # Key ratios bar chart
-    ratios_fig = go.Figure(data=[
-        go.Bar(
-            x=['Production/Consumption', 'Self-Sufficiency', 'Energy Bought', 'Energy Sold'],
-            y=[
-                ratios['production_to_consumption_ratio'],
-                ratios['self_sufficiency_ratio'],
-                ratios['energy_bought_ratio'],
-                ratios['energy_sold_ratio']
-            ],
-            marker_color=['#27ae60', '#3498db', '#e74c3c', '#f39c12'],
-            text=[f"{v}%" for v in [
-                ratios['production_to_consumption_ratio'],
-                ratios['self_sufficiency_ratio'],
-                ratios['energy_bought_ratio'],
-                ratios['energy_sold_ratio']
-            ]],
-            textposition='auto',
-        )
-    ])
-    ratios_fig.update_layout(
-        title="Key Ratios (%)",
-        yaxis_title="Percentage",
-        height=400
-    )
-    
-    return html.Div([
-        html.Div([
-            dcc.Graph(figure=consumption_fig, style={'width': '48%', 'display': 'inline-block'}),
-            dcc.Graph(figure=production_fig, style={'width': '48%', 'display': 'inline-block', 'marginLeft': '4%'}),
-        ]),
-        html.Div([
-            dcc.Graph(figure=ratios_fig),
-        ])
-    ])
+def update_ratio_charts(month_data):
+    ratios = month_data['ratios'] if month_data else {}
+    message = None if ratios else html.Div("No data available")
+    
+    # Only the values change between months, so send patches instead of whole figures
+    consumption_patch = Patch()
+    consumption_patch['data'][0]['values'] = [
+        ratios.get('energy_shared_consumption', 0),
+        ratios.get('energy_bought', 0)
+    ]
+    
+    production_patch = Patch()
+    production_patch['data'][0]['values'] = [
+        ratios.get('energy_shared_production', 0),
+        ratios.get('energy_sold', 0)
+    ]
+    
+    key_ratios = [
+        ratios.get('production_to_consumption_ratio', 0),
+        ratios.get('self_sufficiency_ratio', 0),
+        ratios.get('energy_bought_ratio', 0),
+        ratios.get('energy_sold_ratio', 0)
+    ]
+    ratios_patch = Patch()
+    ratios_patch['data'][0]['y'] = key_ratios
+    ratios_patch['data'][0]['text'] = [f"{v}%" for v in key_ratios]
+    
+    return message, consumption_patch, production_patch, ratios_patch
 
 @app.callback(
     Output('consumption-production-chart', 'figure'),
@@ -369,13 +754,11 @@ def update_comparison_chart(selected_month):
     if df.empty:
         return go.Figure()
     
-    # Map abbreviated categories if needed
-    category_map = {'C': 'Consumption', 'P': 'Production'}
-    if 'C' in df['obis_category'].values or 'P' in df['obis_category'].values:
-        df['obis_category'] = df['obis_category'].map(lambda x: category_map.get(x, x))
+    # Map abbreviated categories to full names; mapping a categorical only touches its labels
+    categories = df['obis_category'].map(lambda category: _CAT_MAP.get(category, category))
     
-    # Group by entity and category
-    grouped = df.groupby(['entity_name', 'obis_category'])['value'].sum().reset_index()
+    # Group by entity and category (observed only: the columns are categoricals)
+    grouped = df.groupby(['entity_name', categories], observed=True)['value'].sum().reset_index()
     
     fig = px.bar(
         grouped,
@@ -385,7 +768,7 @@ def update_comparison_chart(selected_month):
         barmode='group',
         title=f"Consumption vs Production by Entity ({year}-{month:02d})",
         labels={'value': 'Energy (kWh)', 'entity_name': 'Entity'},
-        color_discrete_map={'Consumption': '#e74c3c', 'Production': '#27ae60'}
+        color_discrete_map=_CATEGORY_COLORS
     )
     
     fig.update_layout(height=500)
@@ -402,17 +785,20 @@ def update_trends_chart(selected_month):
     if df.empty:
         return go.Figure()
     
-    # Map abbreviated categories if needed
-    category_map = {'C': 'Consumption', 'P': 'Production'}
-    if 'C' in df['obis_category'].values or 'P' in df['obis_category'].values:
-        df['obis_category'] = df['obis_category'].map(lambda x: category_map.get(x, x))
-    
     # Create year-month label
     df['period'] = df['year'].astype(str) + '-' + df['month'].astype(str).str.zfill(2)
     
     # Filter for key OBIS codes
-    key_codes = ['1-1:1.29.0', '1-1:2.29.0', '1-65:1.29.9', '1-65:2.29.9']
-    df_filtered = df[df['obis_code'].isin(key_codes)]
+    df_filtered = df[df['obis_code'].isin(_TREND_CODES)]
+    
+    # Downsample each series so the chart stays light however long the history gets
+    kept = [
+        series.index[m4_downsample(series['year'].astype(int) * 12 + series['month'].astype(int),
+                                   series['total_value'])]
+        for _, series in df_filtered.groupby('obis_description', sort=False)
+    ]
+    if kept:
+        df_filtered = df_filtered.loc[np.concatenate(kept)]
     
     fig = px.line(
         df_filtered,
@@ -429,67 +815,39 @@ def update_trends_chart(selected_month):
     return fig
 
 @app.callback(
-    Output('data-table', 'children'),
-    Input('month-selector', 'value')
+    Output('data-table', 'data'),
+    Output('data-table', 'page_count'),
+    Output('data-table', 'page_current'),
+    Input('month-selector', 'value'),
+    Input('data-table', 'page_current'),
+    Input('data-table', 'page_size'),
+    Input('data-table', 'sort_by'),
+    Input('data-table', 'filter_query')
 )
-def update_data_table(selected_month):
+def update_data_table(selected_month, page_current, page_size, sort_by, filter_query):
     if not selected_month:
-        return html.Div("No data available")
+        return [], 0, 0
     
-    year, month = map(int, selected_month.split('-'))
-    df = load_metering_data(year, month)
-    
-    if df.empty:
-        return html.Div("No data available")
+    # Start from the first page whenever the month or the filter changes
+    if not ctx.triggered_id or {'month-selector.value', 'data-table.filter_query'} & set(ctx.triggered_prop_ids):
+        page_current = 0
     
-    display_cols = ['entity_type', 'entity_name', 'meter_id', 'obis_code', 
-                   'obis_category', 'obis_description', 'value', 'unit']
+    year, month = map(int, selected_month.split('-'))
+    records, total_rows = load_metering_page(year, month, page_current, page_size, sort_by, filter_query)
     
-    return dash_table.DataTable(
-        data=df[display_cols].to_dict('records'),
-        columns=[{'name': col, 'id': col} for col in display_cols],
-        style_table={'overflowX': 'auto'},
-        style_cell={
-            'textAlign': 'left',
-            'padding': '10px',
-            'fontSize': 12
-        },
-        style_header={
-            'backgroundColor': '#2c3e50',
-            'color': 'white',
-            'fontWeight': 'bold'
-        },
-        style_data_conditional=[
-            {
-                'if': {'row_index': 'odd'},
-                'backgroundColor': '#f9f9f9'
-            }
-        ],
-        page_size=20,
-        sort_action='native',
-        filter_action='native'
-    )
+    return records, math.ceil(total_rows / page_size), page_current
 
 @app.callback(
     Output('summary-table', 'children'),
-    Input('month-selector', 'value')
+    Input('month-store', 'data')
 )
-def update_summary_table(selected_month):
-    if not selected_month:
-        return html.Div("No data available")
-    
-    year, month = map(int, selected_month.split('-'))
-    df = load_summary_data(year, month)
-    
-    if df.empty:
+def update_summary_table(month_data):
+    if not month_data or not month_data['summary']:
         return html.Div("No data available")
     
-    display_cols = ['obis_code', 'obis_category', 'obis_description', 
-                   'total_value', 'num_meters', 'unit']
-    
     return dash_table.DataTable(
-        data=df[display_cols].to_dict('records'),
-        columns=[{'name': col, 'id': col} for col in display_cols],
+        data=month_data['summary'],
+        columns=[{'name': col, 'id': col} for col in SUMMARY_TABLE_COLUMNS],
         style_table={'overflowX': 'auto'},
         style_cell={
             'textAlign': 'left',
@@ -515,6 +873,9 @@ def update_summary_table(selected_month):
     )
 
 if __name__ == '__main__':
+    # Set LOG_LEVEL=DEBUG to see the per-callback debug output
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'WARNING'))
+    
     print("\n" + "="*80)
     print("Starting Energy Data Dashboard")
     print("="*80)
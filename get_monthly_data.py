@@ -5,19 +5,39 @@ from datetime import datetime, timedelta
 from calendar import monthrange
 from typing import Dict, List, Optional, Tuple
 import json
+import logging
 import sys
 import pandas as pd
+import numpy as np
+import orjson
 import os
 import sqlite3
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# Number of Leneda API requests run in parallel
+MAX_WORKERS = 16
+
+# PyYAML's libyaml-based loader when available, pure Python otherwise
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+# Stored in the database's user_version once init_database has created the schema;
+# bump it when tables or indexes change so existing databases are migrated
+SCHEMA_VERSION = 1
 
 
 class MonthlyEnergyDataFetcher:
     """Fetches monthly energy metering data from Leneda API for consumers and producers."""
 
+    # Directories already created by this process
+    _created_dirs = set()
+
     def __init__(self, config_path: str = './configs/monthly.yaml', db_path: str = './db/energy_data.db'):
         """Initialize with configuration from YAML file."""
-        with open(config_path, 'r') as file:
-            self.config = yaml.safe_load(file)
+        self.config = self._load_config(config_path)
         
         self.base_url = self.config['leneda']['url']
         self.api_path = self.config['leneda']['api']['meteringData']
@@ -28,6 +48,19 @@ class MonthlyEnergyDataFetcher:
                 self.config['leneda']['apiKey']['value']
         }
         
+        # Shared keep-alive HTTP session carrying the auth headers, its connection
+        # pool sized for the fetch threads; transient gateway errors are retried
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(
+            pool_connections=MAX_WORKERS,
+            pool_maxsize=MAX_WORKERS,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.log = logging.getLogger(__name__)
+        
         self.db_path = db_path
         
         # Separate OBIS codes by type
@@ -44,15 +77,83 @@ class MonthlyEnergyDataFetcher:
             elif first_digit == '2':
                 self.production_codes.append(obis_info)
         
+        # Code sets for classifying wide-format columns
+        self.consumption_obis_set = {obis_info[0] for obis_info in self.consumption_codes}
+        self.production_obis_set = {obis_info[0] for obis_info in self.production_codes}
+        
         # Initialize database
         self.init_database()
     
+    def _load_config(self, config_path: str) -> Dict:
+        """
+        Load the YAML configuration, reusing a JSON copy cached next to it.
+        
+        The cache (<config_path>.cache.json) is used as long as it is not older
+        than the YAML file, and rewritten whenever the YAML file is parsed.
+        
+        Args:
+            config_path: Path to the YAML configuration file
+            
+        Returns:
+            Configuration dictionary
+        """
+        cache_path = config_path + '.cache.json'
+        
+        try:
+            if os.path.getmtime(cache_path) >= os.path.getmtime(config_path):
+                with open(cache_path, 'r') as file:
+                    return json.load(file)
+        except (OSError, ValueError):
+            pass
+        
+        with open(config_path, 'r') as file:
+            config = yaml.load(file, Loader=YAML_LOADER)
+        
+        # Write the cache atomically; mkstemp creates it readable by the owner only.
+        # The cache is only an optimization, so e.g. a read-only config directory is not an error.
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path) or '.', suffix='.tmp')
+            with os.fdopen(fd, 'w') as file:
+                json.dump(config, file)
+            os.replace(tmp_path, cache_path)
+        except (OSError, TypeError) as e:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            print(f"Warning: Could not cache configuration: {e}")
+        
+        return config
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open a database connection tuned for bulk writes."""
+        conn = sqlite3.connect(self.db_path)
+        # WAL appends to a log instead of rewriting the database file, and
+        # synchronous=NORMAL is safe with WAL while saving an fsync per commit
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-64000")
+        return conn
+    
+    @classmethod
+    def _ensure_dir(cls, path: str):
+        """Create a directory if this process has not already done so."""
+        if path and path not in cls._created_dirs:
+            os.makedirs(path, exist_ok=True)
+            cls._created_dirs.add(path)
+    
     def init_database(self):
-        """Initialize SQLite database with required tables."""
+        """Initialize SQLite database with required tables, unless the schema is already current."""
         # Create data folder if it doesn't exist
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._ensure_dir(os.path.dirname(self.db_path))
+        
+        conn = self._connect()
+        
+        # Tables and indexes only need creating once per database file
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            conn.close()
+            return
         
-        conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
         # Table 1: Raw metering data (one row per meter/obis/month)
@@ -111,77 +212,116 @@ class MonthlyEnergyDataFetcher:
             ON monthly_summaries(year, month)
         ''')
         
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        
         conn.commit()
         conn.close()
         
         print(f"Database initialized at: {self.db_path}")
     
-    def save_to_database(self, df: pd.DataFrame, year: int, month: int):
-        """Save data to SQLite database, replacing existing data for the same month."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def save_to_database(self, df_with_data: pd.DataFrame, year: int, month: int):
+        """Save data to SQLite database, replacing existing data for the same month.
+        
+        Args:
+            df_with_data: Rows with data available, values rounded to 2 decimals
+            year: Year of the data
+            month: Month of the data
+        """
+        conn = self._connect()
         
         try:
-            # Filter only rows with data
-            df_with_data = df[df['data_available'] == True].copy()
-            df_with_data['value'] = df_with_data['value'].round(2)
-            
             if df_with_data.empty:
                 print("No data to save to database.")
                 return
             
-            # Delete existing data for this year/month
-            cursor.execute('''
-                DELETE FROM metering_data 
-                WHERE year = ? AND month = ?
-            ''', (year, month))
+            # Build the insert parameters as plain tuples, in UNIQUE(year, month, meter_id, obis_code)
+            # order so the index B-tree is filled mostly sequentially
+            metering_cols = ['year', 'month', 'entity_type', 'entity_name', 'meter_id', 'obis_code', 
+                             'obis_category', 'obis_description', 'value', 'unit', 'started_at', 
+                             'ended_at', 'calculated', 'type']
+            metering_records = list(
+                df_with_data.sort_values(['year', 'month', 'meter_id', 'obis_code'])[metering_cols]
+                .itertuples(index=False, name=None)
+            )
             
-            cursor.execute('''
-                DELETE FROM monthly_summaries 
-                WHERE year = ? AND month = ?
-            ''', (year, month))
+            new_keys = set(zip(df_with_data['meter_id'], df_with_data['obis_code']))
             
-            # Insert metering data
-            for _, row in df_with_data.iterrows():
-                cursor.execute('''
+            # Replace the whole month in a single transaction
+            with conn:
+                # Insert metering data, updating rows already stored for this month
+                conn.executemany('''
                     INSERT INTO metering_data 
                     (year, month, entity_type, entity_name, meter_id, obis_code, 
                      obis_category, obis_description, value, unit, started_at, 
                      ended_at, calculated, type)
                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    row['year'], row['month'], row['entity_type'], row['entity_name'],
-                    row['meter_id'], row['obis_code'], row['obis_category'],
-                    row['obis_description'], row['value'], row['unit'],
-                    row['started_at'], row['ended_at'], row['calculated'], row['type']
-                ))
-            
-            # Calculate and insert summaries
-            summaries = df_with_data.groupby(['obis_code', 'obis_category', 'obis_description']).agg({
-                'value': 'sum',
-                'entity_name': 'count',
-                'unit': 'first'
-            }).reset_index()
-            
-            summaries.columns = ['obis_code', 'obis_category', 'obis_description', 
-                                'total_value', 'num_meters', 'unit']
-            
-            for _, row in summaries.iterrows():
-                cursor.execute('''
+                    ON CONFLICT(year, month, meter_id, obis_code) DO UPDATE SET 
+                        entity_type = excluded.entity_type, 
+                        entity_name = excluded.entity_name, 
+                        obis_category = excluded.obis_category, 
+                        obis_description = excluded.obis_description, 
+                        value = excluded.value, 
+                        unit = excluded.unit, 
+                        started_at = excluded.started_at, 
+                        ended_at = excluded.ended_at, 
+                        calculated = excluded.calculated, 
+                        type = excluded.type
+                ''', metering_records)
+                
+                # Remove rows stored earlier that this fetch no longer returned (usually none)
+                stale_keys = [
+                    (year, month, meter_id, obis_code)
+                    for meter_id, obis_code in conn.execute('''
+                        SELECT meter_id, obis_code FROM metering_data 
+                        WHERE year = ? AND month = ?
+                    ''', (year, month))
+                    if (meter_id, obis_code) not in new_keys
+                ]
+                conn.executemany('''
+                    DELETE FROM metering_data 
+                    WHERE year = ? AND month = ? AND meter_id = ? AND obis_code = ?
+                ''', stale_keys)
+                
+                # Calculate and upsert summaries from the rows just written
+                cursor = conn.execute('''
                     INSERT INTO monthly_summaries 
                     (year, month, obis_code, obis_category, obis_description, 
                      total_value, num_meters, unit)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    year, month, row['obis_code'], row['obis_category'],
-                    row['obis_description'], round(row['total_value'], 2),
-                    row['num_meters'], row['unit']
-                ))
-            
-            conn.commit()
+                    SELECT year, month, obis_code, obis_category, obis_description, 
+                           ROUND(SUM(value), 2), COUNT(*), MIN(unit)
+                    FROM metering_data 
+                    WHERE year = ? AND month = ? 
+                    GROUP BY obis_code, obis_category, obis_description
+                    ON CONFLICT(year, month, obis_code) DO UPDATE SET 
+                        obis_category = excluded.obis_category, 
+                        obis_description = excluded.obis_description, 
+                        total_value = excluded.total_value, 
+                        num_meters = excluded.num_meters, 
+                        unit = excluded.unit
+                ''', (year, month))
+                summaries_inserted = cursor.rowcount
+                
+                # Remove summaries of OBIS codes without data this month (usually none)
+                conn.execute('''
+                    DELETE FROM monthly_summaries 
+                    WHERE year = ? AND month = ? AND obis_code NOT IN (
+                        SELECT obis_code FROM metering_data 
+                        WHERE year = ? AND month = ?
+                    )
+                ''', (year, month, year, month))
+                
+                # Drop the dashboard's cached ratios, they are recomputed from the new data.
+                # The dashboard owns the monthly_ratios table and creates it on startup.
+                ratios_table = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'monthly_ratios'"
+                ).fetchone()
+                if ratios_table:
+                    conn.execute('''
+                        DELETE FROM monthly_ratios 
+                        WHERE year = ? AND month = ?
+                    ''', (year, month))
             
             rows_inserted = len(df_with_data)
-            summaries_inserted = len(summaries)
             
             print(f"\n{'='*80}")
             print(f"DATABASE UPDATE COMPLETE")
@@ -192,7 +332,6 @@ class MonthlyEnergyDataFetcher:
             print(f"{'='*80}")
             
         except Exception as e:
-            conn.rollback()
             print(f"Error saving to database: {e}")
             raise
         finally:
@@ -255,16 +394,18 @@ class MonthlyEnergyDataFetcher:
                f"obisCode={obis_code}&startDate={start_date}&endDate={end_date}"
                f"&aggregationLevel=Infinite&transformationMode=Accumulation")
         
-        print(f"  Fetching: {obis_code}")
+        # Requests run in parallel, so every line names the series it belongs to
+        label = f"{meter_id} {obis_code}"
         
         try:
-            response = requests.get(url, headers=self.headers, timeout=30)
+            self.log.debug("  → %s: Fetching", label)
+            response = self.session.get(url, timeout=30)
             
             if response.status_code == 404:
-                print(f"    ⚠ No data available for this OBIS code")
+                self.log.warning("  ⚠ %s: No data available for this OBIS code", label)
                 return None
             elif response.status_code != 200:
-                print(f"    ✗ Error {response.status_code}: {response.text}")
+                self.log.error("  ✗ %s: Error %s: %s", label, response.status_code, response.text)
                 return None
             
             data = response.json()
@@ -273,20 +414,20 @@ class MonthlyEnergyDataFetcher:
             if data.get('aggregatedTimeSeries') and len(data['aggregatedTimeSeries']) > 0:
                 value = data['aggregatedTimeSeries'][0].get('value', 0)
                 unit = data.get('unit', '')
-                print(f"    ✓ Value: {value} {unit}")
+                self.log.info("  ✓ %s: Value: %s %s", label, value, unit)
                 return data
             else:
-                print(f"    ⚠ No time series data returned")
+                self.log.warning("  ⚠ %s: No time series data returned", label)
                 return None
                 
         except requests.exceptions.Timeout:
-            print(f"    ✗ Request timeout")
+            self.log.error("  ✗ %s: Request timeout", label)
             return None
         except requests.exceptions.RequestException as e:
-            print(f"    ✗ Request error: {e}")
+            self.log.error("  ✗ %s: Request error: %s", label, e)
             return None
         except json.JSONDecodeError:
-            print(f"    ✗ Invalid JSON response")
+            self.log.error("  ✗ %s: Invalid JSON response", label)
             return None
     
     def fetch_all_data(self, year: Optional[int] = None, month: Optional[int] = None) -> Tuple[Dict, pd.DataFrame]:
@@ -319,167 +460,120 @@ class MonthlyEnergyDataFetcher:
             'producers': {}
         }
         
-        # List to collect data for DataFrame
-        df_data = []
-        
-        # Process CONSUMERS with CONSUMPTION codes
-        print(f"\n{'='*80}")
-        print("PROCESSING CONSUMERS")
-        print(f"{'='*80}")
-        
-        consumer_names = self.config['consumers']['names']
-        consumer_meters = self.config['consumers']['smartmeters']
-        
-        for name, meter_id in zip(consumer_names, consumer_meters):
-            print(f"\n{'─'*80}")
-            print(f"Consumer: {name}")
-            print(f"Meter ID: {meter_id}")
-            print(f"{'─'*80}")
-            
-            results['consumers'][name] = {
-                'meter_id': meter_id,
-                'data': {}
-            }
+        # Every series to fetch: consumption codes for consumers, production codes for producers
+        tasks = [
+            ('consumer', name, meter_id, obis_info)
+            for name, meter_id in zip(self.config['consumers']['names'], self.config['consumers']['smartmeters'])
+            for obis_info in self.consumption_codes
+        ] + [
+            ('producer', name, meter_id, obis_info)
+            for name, meter_id in zip(self.config['producers']['names'], self.config['producers']['smartmeters'])
+            for obis_info in self.production_codes
+        ]
+        
+        # The requests spend their time waiting on the network, so run them in parallel
+        print(f"\nFetching {len(tasks)} series ({MAX_WORKERS} parallel requests)")
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            responses = list(executor.map(
+                lambda task: self.fetch_metering_data(task[2], task[3][0], start_date, end_date),
+                tasks
+            ))
+        
+        # Preallocate one typed array per DataFrame column, filled by row index
+        n = len(tasks)
+        entity_types = np.empty(n, dtype=object)
+        entity_names = np.empty(n, dtype=object)
+        meter_ids = np.empty(n, dtype=object)
+        obis_codes = np.empty(n, dtype=object)
+        obis_categories = np.empty(n, dtype=object)
+        obis_descriptions = np.empty(n, dtype=object)
+        values = np.full(n, np.nan)
+        units = np.empty(n, dtype=object)
+        started_ats = np.empty(n, dtype=object)
+        ended_ats = np.empty(n, dtype=object)
+        calculated = np.empty(n, dtype=object)
+        types = np.empty(n, dtype=object)
+        data_available = np.zeros(n, dtype=bool)
+        
+        for i, ((entity_type, name, meter_id, obis_info), data) in enumerate(zip(tasks, responses)):
+            obis_code = obis_info[0]
+            obis_category = obis_info[1]
+            obis_description = obis_info[2]
             
-            # Iterate through CONSUMPTION OBIS codes only
-            for obis_info in self.consumption_codes:
-                obis_code = obis_info[0]
-                obis_category = obis_info[1]
-                obis_description = obis_info[2]
-                
-                data = self.fetch_metering_data(meter_id, obis_code, start_date, end_date)
-                
-                # Prepare row for DataFrame
-                row = {
-                    'year': calc_year,
-                    'month': calc_month,
-                    'start_date': start_date,
-                    'end_date': end_date,
-                    'entity_type': 'consumer',
-                    'entity_name': name,
+            entities = results['consumers' if entity_type == 'consumer' else 'producers']
+            if name not in entities:
+                entities[name] = {
                     'meter_id': meter_id,
-                    'obis_code': obis_code,
-                    'obis_category': obis_category,
-                    'obis_description': obis_description,
-                    'value': None,
-                    'unit': None,
-                    'started_at': None,
-                    'ended_at': None,
-                    'calculated': None,
-                    'type': None,
-                    'data_available': False
+                    'data': {}
                 }
-                
-                if data:
-                    results['consumers'][name]['data'][obis_code] = {
-                        'category': obis_category,
-                        'description': obis_description,
-                        'response': data
-                    }
-                    
-                    # Extract data for DataFrame
-                    if data.get('aggregatedTimeSeries') and len(data['aggregatedTimeSeries']) > 0:
-                        ts = data['aggregatedTimeSeries'][0]
-                        row['value'] = ts.get('value')
-                        row['started_at'] = ts.get('startedAt')
-                        row['ended_at'] = ts.get('endedAt')
-                        row['calculated'] = ts.get('calculated')
-                        row['type'] = ts.get('type')
-                        row['unit'] = data.get('unit')
-                        row['data_available'] = True
-                
-                df_data.append(row)
-        
-        # Process PRODUCERS with PRODUCTION codes
-        print(f"\n{'='*80}")
-        print("PROCESSING PRODUCERS")
-        print(f"{'='*80}")
-        
-        producer_names = self.config['producers']['names']
-        producer_meters = self.config['producers']['smartmeters']
-        
-        for name, meter_id in zip(producer_names, producer_meters):
-            print(f"\n{'─'*80}")
-            print(f"Producer: {name}")
-            print(f"Meter ID: {meter_id}")
-            print(f"{'─'*80}")
             
-            results['producers'][name] = {
-                'meter_id': meter_id,
-                'data': {}
-            }
+            entity_types[i] = entity_type
+            entity_names[i] = name
+            meter_ids[i] = meter_id
+            obis_codes[i] = obis_code
+            obis_categories[i] = obis_category
+            obis_descriptions[i] = obis_description
             
-            # Iterate through PRODUCTION OBIS codes only
-            for obis_info in self.production_codes:
-                obis_code = obis_info[0]
-                obis_category = obis_info[1]
-                obis_description = obis_info[2]
-                
-                data = self.fetch_metering_data(meter_id, obis_code, start_date, end_date)
-                
-                # Prepare row for DataFrame
-                row = {
-                    'year': calc_year,
-                    'month': calc_month,
-                    'start_date': start_date,
-                    'end_date': end_date,
-                    'entity_type': 'producer',
-                    'entity_name': name,
-                    'meter_id': meter_id,
-                    'obis_code': obis_code,
-                    'obis_category': obis_category,
-                    'obis_description': obis_description,
-                    'value': None,
-                    'unit': None,
-                    'started_at': None,
-                    'ended_at': None,
-                    'calculated': None,
-                    'type': None,
-                    'data_available': False
+            if data:
+                entities[name]['data'][obis_code] = {
+                    'category': obis_category,
+                    'description': obis_description,
+                    'response': data
                 }
                 
-                if data:
-                    results['producers'][name]['data'][obis_code] = {
-                        'category': obis_category,
-                        'description': obis_description,
-                        'response': data
-                    }
-                    
-                    # Extract data for DataFrame
-                    if data.get('aggregatedTimeSeries') and len(data['aggregatedTimeSeries']) > 0:
-                        ts = data['aggregatedTimeSeries'][0]
-                        row['value'] = ts.get('value')
-                        row['started_at'] = ts.get('startedAt')
-                        row['ended_at'] = ts.get('endedAt')
-                        row['calculated'] = ts.get('calculated')
-                        row['type'] = ts.get('type')
-                        row['unit'] = data.get('unit')
-                        row['data_available'] = True
-                
-                df_data.append(row)
+                # Extract data for DataFrame
+                if data.get('aggregatedTimeSeries') and len(data['aggregatedTimeSeries']) > 0:
+                    ts = data['aggregatedTimeSeries'][0]
+                    values[i] = ts.get('value')
+                    started_ats[i] = ts.get('startedAt')
+                    ended_ats[i] = ts.get('endedAt')
+                    calculated[i] = ts.get('calculated')
+                    types[i] = ts.get('type')
+                    units[i] = data.get('unit')
+                    data_available[i] = True
         
         # Create DataFrame
-        df = pd.DataFrame(df_data)
+        df = pd.DataFrame({
+            'year': calc_year,
+            'month': calc_month,
+            'start_date': start_date,
+            'end_date': end_date,
+            'entity_type': entity_types,
+            'entity_name': entity_names,
+            'meter_id': meter_ids,
+            'obis_code': obis_codes,
+            'obis_category': obis_categories,
+            'obis_description': obis_descriptions,
+            'value': values,
+            'unit': units,
+            'started_at': started_ats,
+            'ended_at': ended_ats,
+            'calculated': calculated,
+            'type': types,
+            'data_available': data_available
+        })
+        
+        # Store the low-cardinality string columns as categories and shrink the period columns
+        for col in ('entity_type', 'obis_code', 'obis_category', 'obis_description', 'unit', 'meter_id'):
+            df[col] = df[col].astype('category')
+        df['year'] = df['year'].astype('int16')
+        df['month'] = df['month'].astype('int8')
         
         return results, df
     
-    def create_wide_format_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
+    def create_wide_format_dataframe(self, df_filtered: pd.DataFrame) -> pd.DataFrame:
         """
         Convert the long format DataFrame to wide format with consumption and production columns.
         
         Args:
-            df: DataFrame in long format
+            df_filtered: DataFrame in long format, only rows with data, values rounded to 2 decimals
             
         Returns:
             DataFrame in wide format with one row per metering point
         """
-        if df.empty or not df['data_available'].any():
+        if df_filtered.empty:
             return pd.DataFrame()
         
-        # Filter only rows with data and round values to 2 decimals
-        df_filtered = df[df['data_available'] == True].copy()
-        df_filtered['value'] = df_filtered['value'].round(2)
-        
         # Create a mapping of OBIS codes to descriptions
         obis_descriptions = {}
         for obis_info in self.config['obiscode']:
@@ -487,36 +581,23 @@ class MonthlyEnergyDataFetcher:
             description = obis_info[2]  # Last element in the array
             obis_descriptions[obis_code] = description
         
-        # Create pivot table
-        pivot_data = []
-        
-        # Get unique metering points
-        for (entity_type, entity_name, meter_id), group in df_filtered.groupby(['entity_type', 'entity_name', 'meter_id']):
-            row = {
-                'entity_type': entity_type,
-                'name': entity_name,
-                'metering_point': meter_id,
-                'year': group['year'].iloc[0],
-                'month': group['month'].iloc[0]
-            }
-            
-            # Add OBIS code values as columns
-            for _, record in group.iterrows():
-                obis_code = record['obis_code']
-                value = record['value']
-                row[obis_code] = value
-            
-            pivot_data.append(row)
-        
-        # Create DataFrame
-        wide_df = pd.DataFrame(pivot_data)
+        # Create pivot table: one row per metering point, one column per OBIS code
+        wide_df = df_filtered.pivot_table(
+            index=['entity_type', 'entity_name', 'meter_id', 'year', 'month'],
+            columns='obis_code',
+            values='value',
+            aggfunc='first',
+            observed=True
+        ).reset_index()
+        wide_df.columns.name = None
+        wide_df = wide_df.rename(columns={'entity_name': 'name', 'meter_id': 'metering_point'})
         
         # Reorder columns: year, month, name, metering_point, then consumption codes, then production codes
         base_cols = ['year', 'month', 'entity_type', 'name', 'metering_point']
         
         # Get consumption and production column names (OBIS codes)
-        consumption_cols = [col for col in wide_df.columns if col.startswith('1-') and ':1.' in col]
-        production_cols = [col for col in wide_df.columns if col.startswith('1-') and ':2.' in col]
+        consumption_cols = [col for col in wide_df.columns if col in self.consumption_obis_set]
+        production_cols = [col for col in wide_df.columns if col in self.production_obis_set]
         
         # Sort OBIS codes for consistent ordering
         consumption_cols.sort()
@@ -535,10 +616,6 @@ class MonthlyEnergyDataFetcher:
             if col in wide_df.columns:
                 totals_row[col] = round(wide_df[col].sum(), 2)
         
-        # Append totals row
-        totals_df = pd.DataFrame([totals_row])
-        wide_df = pd.concat([wide_df, totals_df], ignore_index=True)
-        
         # Add description row
         description_row = {'year': 'DESCRIPTION', 'month': '', 'entity_type': '', 'name': '', 'metering_point': ''}
         
@@ -548,17 +625,25 @@ class MonthlyEnergyDataFetcher:
             else:
                 description_row[col] = ''
         
-        # Append description row
-        description_df = pd.DataFrame([description_row])
-        wide_df = pd.concat([wide_df, description_df], ignore_index=True)
+        # Append totals and description rows in a single concat
+        aux_df = pd.DataFrame([totals_row, description_row])
+        wide_df = pd.concat([wide_df, aux_df], ignore_index=True)
         
         return wide_df
     
-    def save_results(self, results: Dict, df: pd.DataFrame, output_file: Optional[str] = None):
-        """Save results to JSON, CSV, and Excel files in the /data folder."""
+    def save_results(self, results: Dict, df_with_data: pd.DataFrame, output_file: Optional[str] = None,
+                     detail_sheet: bool = True):
+        """Save results to JSON, CSV, and Excel files in the /data folder.
+        
+        Args:
+            results: Results dictionary from fetch_all_data
+            df_with_data: Rows with data available, values rounded to 2 decimals
+            output_file: Base name for the output files (default: energy_data_YYYY_MM)
+            detail_sheet: Also write the long-format rows to a 'Detailed Data' Excel sheet
+        """
         # Create /data folder if it doesn't exist
         data_folder = 'data'
-        os.makedirs(data_folder, exist_ok=True)
+        self._ensure_dir(data_folder)
         
         if output_file is None:
             year = results['period']['year']
@@ -574,11 +659,11 @@ class MonthlyEnergyDataFetcher:
             excel_file = os.path.join(data_folder, f"{base_name}.xlsx")
         
         # Save JSON (original format)
-        with open(json_file, 'w') as f:
-            json.dump(results, indent=2, fp=f)
+        with open(json_file, 'wb') as f:
+            f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
         
         # Create wide format DataFrame
-        wide_df = self.create_wide_format_dataframe(df)
+        wide_df = self.create_wide_format_dataframe(df_with_data)
         
         # Save CSV in wide format
         if not wide_df.empty:
@@ -588,15 +673,13 @@ class MonthlyEnergyDataFetcher:
             csv_saved = False
         
         # Save Excel with multiple sheets
-        with pd.ExcelWriter(excel_file, engine='openpyxl') as writer:
+        with pd.ExcelWriter(excel_file, engine='xlsxwriter') as writer:
             # Main sheet - wide format with totals
             if not wide_df.empty:
                 wide_df.to_excel(writer, sheet_name='Energy Data', index=False)
             
             # Original detailed data (for reference)
-            df_with_data = df[df['data_available'] == True].copy()
-            if not df_with_data.empty:
-                df_with_data['value'] = df_with_data['value'].round(2)
+            if detail_sheet and not df_with_data.empty:
                 display_cols = ['year', 'month', 'entity_type', 'entity_name', 'meter_id', 
                                'obis_code', 'obis_category', 'obis_description', 'value', 'unit']
                 df_with_data[display_cols].to_excel(writer, sheet_name='Detailed Data', index=False)
@@ -607,26 +690,33 @@ class MonthlyEnergyDataFetcher:
         if csv_saved:
             print(f"  - CSV:   {os.path.basename(csv_file)} (wide format with totals)")
         print(f"  - Excel: {os.path.basename(excel_file)}")
-        print(f"    Sheets: Energy Data (wide format), Detailed Data")
+        if detail_sheet:
+            print(f"    Sheets: Energy Data (wide format), Detailed Data")
+        else:
+            print(f"    Sheets: Energy Data (wide format)")
         print(f"{'='*80}")
     
-    def print_summary(self, results: Dict, df: pd.DataFrame):
-        """Print a summary of the results."""
+    def print_summary(self, results: Dict, df: pd.DataFrame, df_with_data: pd.DataFrame):
+        """Print a summary of the results.
+        
+        Args:
+            results: Results dictionary from fetch_all_data
+            df: All fetched rows, including those without data
+            df_with_data: Rows with data available, values rounded to 2 decimals
+        """
         print(f"\n{'='*80}")
         print("SUMMARY")
         print(f"{'='*80}")
         
         print(f"\nTotal API calls: {df.shape[0]}")
         print(f"Successful retrievals: {df['data_available'].sum()}")
-        print(f"Failed retrievals: {(~df['data_available']).sum()}")
+        print(f"Failed retrievals: {len(df) - df['data_available'].sum()}")
         
         # Summary by entity type
         print(f"\n{'─'*80}")
         print("By Entity Type:")
-        df_with_data = df[df['data_available'] == True].copy()
         if not df_with_data.empty:
-            df_with_data['value'] = df_with_data['value'].round(2)
-            entity_summary = df_with_data.groupby('entity_type').agg({
+            entity_summary = df_with_data.groupby('entity_type', observed=True).agg({
                 'entity_name': 'nunique',
                 'value': 'sum'
             })
@@ -634,7 +724,7 @@ class MonthlyEnergyDataFetcher:
             print(entity_summary.to_string())
         
         # Create and display wide format preview
-        wide_df = self.create_wide_format_dataframe(df)
+        wide_df = self.create_wide_format_dataframe(df_with_data)
         
         if not wide_df.empty:
             print(f"\n{'─'*80}")
@@ -685,14 +775,39 @@ def main():
         action='store_true',
         help='Do not save results to file'
     )
+    parser.add_argument(
+        '--no-detail-sheet',
+        action='store_true',
+        help='Omit the Detailed Data sheet from the Excel file'
+    )
     parser.add_argument(
         '--db-path',
         default='./data/energy_data.db',
         help='Path to SQLite database (default: data/energy_data.db)'
     )
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument(
+        '--quiet', '-q',
+        action='store_true',
+        help='Only log failed API requests'
+    )
+    verbosity.add_argument(
+        '--verbose', '-v',
+        action='store_true',
+        help='Also log every API request as it starts'
+    )
     
     args = parser.parse_args()
     
+    # Per-request lines go through logging so they can be filtered by level
+    if args.quiet:
+        log_level = logging.ERROR
+    elif args.verbose:
+        log_level = logging.DEBUG
+    else:
+        log_level = logging.INFO
+    logging.basicConfig(level=log_level, format='%(message)s', stream=sys.stdout)
+    
     try:
         # Initialize fetcher
         fetcher = MonthlyEnergyDataFetcher(args.config, args.db_path)
@@ -707,15 +822,19 @@ def main():
         calc_year = results['period']['year']
         calc_month = results['period']['month']
         
+        # Filter only rows with data and round values to 2 decimals, once for all outputs
+        df_with_data = df[df['data_available']].copy()
+        df_with_data['value'] = df_with_data['value'].round(2)
+        
         # Print summary
-        fetcher.print_summary(results, df)
+        fetcher.print_summary(results, df, df_with_data)
         
         # Save to database
-        fetcher.save_to_database(df, calc_year, calc_month)
+        fetcher.save_to_database(df_with_data, calc_year, calc_month)
         
         # Save results
         if not args.no_save:
-            fetcher.save_results(results, df, args.output)
+            fetcher.save_results(results, df_with_data, args.output, detail_sheet=not args.no_detail_sheet)
         
         return df  # Return DataFrame for programmatic use
         